@@ -48,11 +48,43 @@ import time
 import zlib
 import bmesh
 import os
-from operator import itemgetter
-from struct import pack, unpack
+import numpy as np
+from functools import lru_cache
+from struct import pack, unpack, Struct
 from mathutils import Matrix
 from bpy_extras import io_utils, node_shader_utils
 
+# use SIMD accelerated deflate for the texture conversion if it's installed
+# (python-isal is a drop-in replacement for zlib), otherwise stock zlib
+try:
+    from isal import isal_zlib as zlib_fast
+except ImportError:
+    zlib_fast = zlib
+
+# compile the per-frame bone pose math to machine code if numba is installed,
+# otherwise it is done with (slightly slower) numpy array operations
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# index writers and masks for each index size (see idxsize in write_m3d)
+idx_packers = (Struct("<B").pack, Struct("<H").pack, Struct("<I").pack)
+idx_masks = (0xFF, 0xFFFF, 0xFFFFFFFF)
+idx_dtypes = ("<u1", "<u2", "<u4")
+
+# binary coordinate and texture coordinate types and scales for each quality
+crd_dtypes = ("<i1", "<i2", "<f4", "<f8")
+crd_scales = (127, 32767, 1, 1)
+uv_dtypes = ("<u1", "<u2", "<f4", "<f8")
+uv_scales = (255, 65535, 1, 1)
+
+# character translations for safestr (name identifiers, single line, CRLF lines, keep lines)
+safestr_name = str.maketrans(' /\\\n', '___ ', '\r')
+safestr_line = str.maketrans('\n', ' ', '\r')
+safestr_crlf = str.maketrans({'\r': None, '\n': '\r\n'})
+safestr_cr = str.maketrans('', '', '\r')
+
 # -----------------------------------------------------------------------------
 #  Blender material property and M3D property type assignments
 #  See https://gitlab.com/bztsrc/model3d/blob/master/docs/m3d_format.md section Materials)
@@ -82,6 +114,183 @@ mat_property_map = {
 }
 
 
+# -----------------------------------------------------------------------------
+# Batched matrix math on numpy arrays of matrices (for the animation frames)
+
+# matrix columns shorter than this are scaled to zero (same limit as in Blender's
+# normalize_v3). Bones scaled to zero are a common way to hide things, they have
+# no orientation of their own, so they get the identity axis instead
+zero_scale = 1e-35
+
+# rotation matrices to normalized quaternions in x, y, z, w order
+def mats2quats(m):
+    m00, m11, m22 = m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]
+    tr = m00 + m11 + m22
+    q = np.empty((len(m), 4))
+    # pick the largest of w, x, y, z to divide by (Shepperd's method)
+    c = [tr > 0.0]
+    c.append(~c[0] & (m00 > m11) & (m00 > m22))
+    c.append(~c[0] & ~c[1] & (m11 > m22))
+    c.append(~c[0] & ~c[1] & ~c[2])
+    a = m[c[0]]
+    s = np.sqrt(tr[c[0]] + 1.0) * 2.0
+    q[c[0]] = np.column_stack(((a[:, 2, 1] - a[:, 1, 2]) / s, (a[:, 0, 2] - a[:, 2, 0]) / s,
+                               (a[:, 1, 0] - a[:, 0, 1]) / s, 0.25 * s))
+    a = m[c[1]]
+    s = np.sqrt(1.0 + a[:, 0, 0] - a[:, 1, 1] - a[:, 2, 2]) * 2.0
+    q[c[1]] = np.column_stack((0.25 * s, (a[:, 0, 1] + a[:, 1, 0]) / s,
+                               (a[:, 0, 2] + a[:, 2, 0]) / s, (a[:, 2, 1] - a[:, 1, 2]) / s))
+    a = m[c[2]]
+    s = np.sqrt(1.0 + a[:, 1, 1] - a[:, 0, 0] - a[:, 2, 2]) * 2.0
+    q[c[2]] = np.column_stack(((a[:, 0, 1] + a[:, 1, 0]) / s, 0.25 * s,
+                               (a[:, 1, 2] + a[:, 2, 1]) / s, (a[:, 0, 2] - a[:, 2, 0]) / s))
+    a = m[c[3]]
+    s = np.sqrt(1.0 + a[:, 2, 2] - a[:, 0, 0] - a[:, 1, 1]) * 2.0
+    q[c[3]] = np.column_stack(((a[:, 0, 2] + a[:, 2, 0]) / s, (a[:, 1, 2] + a[:, 2, 1]) / s,
+                               0.25 * s, (a[:, 1, 0] - a[:, 0, 1]) / s))
+    # same canonical form as mathutils, w is never negative
+    q[q[:, 3] < 0.0] *= -1.0
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    return q
+
+
+# normalized quaternions (x, y, z, w) to rotation matrices
+def quats2mats(q):
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    return np.stack((np.column_stack((1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y - z * w), 2.0 * (x * z + y * w))),
+                     np.column_stack((2.0 * (x * y + z * w), 1.0 - 2.0 * (x * x + z * z), 2.0 * (y * z - x * w))),
+                     np.column_stack((2.0 * (x * z - y * w), 2.0 * (y * z + x * w), 1.0 - 2.0 * (x * x + y * y)))),
+                    axis=1)
+
+
+# same as matnorm() and then to_translation() and to_quaternion() on each
+# matrix, but for all at once. If parents are given (index, -1 for none)
+# then positions and orientations are relative to the parent's
+def posenorm(mats, parents=None):
+    if njit is not None:
+        pos = np.empty((len(mats), 3))
+        ori = np.empty((len(mats), 4))
+        posenorm_jit(np.ascontiguousarray(mats, dtype=np.float64),
+                     np.full(len(mats), -1, dtype=np.int64) if parents is None else parents, pos, ori)
+        return pos, ori
+    l = np.linalg.norm(mats[:, :3, :3], axis=1, keepdims=True)
+    z = l < zero_scale
+    rot = np.where(z, np.eye(3), mats[:, :3, :3] / np.where(z, 1.0, l))
+    rot[np.linalg.det(rot) < 0.0] *= -1.0
+    pos = mats[:, :3, 3]
+    ori = mats2quats(rot)
+    if parents is not None:
+        c = parents >= 0
+        p = parents[c]
+        inv = quats2mats(ori)[p].transpose(0, 2, 1)
+        pos = pos.copy()
+        pos[c] = np.einsum('nij,nj->ni', inv, pos[c] - pos[p])
+        ori[c] = mats2quats(inv @ quats2mats(ori[c]))
+    return pos, ori
+
+
+# same as posenorm, but one matrix at a time in loops which numba can compile
+def posenorm_loop(mats, parents, pos, ori):
+    n = mats.shape[0]
+    rot = np.empty((n, 3, 3))
+    for k in range(n):
+        m = rot[k]
+        for j in range(3):
+            l = np.sqrt(mats[k, 0, j] * mats[k, 0, j] + mats[k, 1, j] * mats[k, 1, j] + mats[k, 2, j] * mats[k, 2, j])
+            for i in range(3):
+                if l < zero_scale:
+                    m[i, j] = 1.0 if i == j else 0.0
+                else:
+                    m[i, j] = mats[k, i, j] / l
+        if m[0, 0] * (m[1, 1] * m[2, 2] - m[1, 2] * m[2, 1]) - m[0, 1] * (m[1, 0] * m[2, 2] - m[1, 2] * m[2, 0]) + \
+                m[0, 2] * (m[1, 0] * m[2, 1] - m[1, 1] * m[2, 0]) < 0.0:
+            for i in range(3):
+                for j in range(3):
+                    m[i, j] = -m[i, j]
+        mat2quat_loop(m, ori[k])
+        # from here on, rot is the normalized rotation matrix (needed for the parents)
+        quat2mat_loop(ori[k], m)
+    for k in range(n):
+        p = parents[k]
+        if p < 0:
+            for i in range(3):
+                pos[k, i] = mats[k, i, 3]
+            continue
+        # inverse of the parent's rotation is its transpose
+        m = np.empty((3, 3))
+        for i in range(3):
+            pos[k, i] = 0.0
+            for j in range(3):
+                pos[k, i] += rot[p, j, i] * (mats[k, j, 3] - mats[p, j, 3])
+                m[i, j] = rot[p, 0, i] * rot[k, 0, j] + rot[p, 1, i] * rot[k, 1, j] + rot[p, 2, i] * rot[k, 2, j]
+        mat2quat_loop(m, ori[k])
+
+
+# rotation matrix to normalized quaternion (x, y, z, w), see mats2quats
+def mat2quat_loop(m, q):
+    tr = m[0, 0] + m[1, 1] + m[2, 2]
+    if tr > 0.0:
+        c, s = 3, np.sqrt(tr + 1.0) * 2.0
+    elif m[0, 0] > m[1, 1] and m[0, 0] > m[2, 2]:
+        c, s = 0, np.sqrt(1.0 + m[0, 0] - m[1, 1] - m[2, 2]) * 2.0
+    elif m[1, 1] > m[2, 2]:
+        c, s = 1, np.sqrt(1.0 + m[1, 1] - m[0, 0] - m[2, 2]) * 2.0
+    else:
+        c, s = 2, np.sqrt(1.0 + m[2, 2] - m[0, 0] - m[1, 1]) * 2.0
+    # only a degenerate (not a rotation) matrix gets here without a positive s
+    if not s > 0.0:
+        q[0], q[1], q[2], q[3] = 0.0, 0.0, 0.0, 1.0
+        return
+    if c == 3:
+        q[0] = (m[2, 1] - m[1, 2]) / s
+        q[1] = (m[0, 2] - m[2, 0]) / s
+        q[2] = (m[1, 0] - m[0, 1]) / s
+        q[3] = 0.25 * s
+    elif c == 0:
+        q[0] = 0.25 * s
+        q[1] = (m[0, 1] + m[1, 0]) / s
+        q[2] = (m[0, 2] + m[2, 0]) / s
+        q[3] = (m[2, 1] - m[1, 2]) / s
+    elif c == 1:
+        q[0] = (m[0, 1] + m[1, 0]) / s
+        q[1] = 0.25 * s
+        q[2] = (m[1, 2] + m[2, 1]) / s
+        q[3] = (m[0, 2] - m[2, 0]) / s
+    else:
+        q[0] = (m[0, 2] + m[2, 0]) / s
+        q[1] = (m[1, 2] + m[2, 1]) / s
+        q[2] = 0.25 * s
+        q[3] = (m[1, 0] - m[0, 1]) / s
+    l = np.sqrt(q[0] * q[0] + q[1] * q[1] + q[2] * q[2] + q[3] * q[3])
+    if not l > 0.0:
+        q[0], q[1], q[2], q[3] = 0.0, 0.0, 0.0, 1.0
+        return
+    if q[3] < 0.0:
+        l = -l
+    for i in range(4):
+        q[i] /= l
+
+
+# normalized quaternion (x, y, z, w) to rotation matrix, see quats2mats
+def quat2mat_loop(q, m):
+    x, y, z, w = q[0], q[1], q[2], q[3]
+    m[0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    m[0, 1] = 2.0 * (x * y - z * w)
+    m[0, 2] = 2.0 * (x * z + y * w)
+    m[1, 0] = 2.0 * (x * y + z * w)
+    m[1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    m[1, 2] = 2.0 * (y * z - x * w)
+    m[2, 0] = 2.0 * (x * z - y * w)
+    m[2, 1] = 2.0 * (y * z + x * w)
+    m[2, 2] = 1.0 - 2.0 * (x * x + y * y)
+
+
+if njit is not None:
+    mat2quat_loop = njit(mat2quat_loop)
+    quat2mat_loop = njit(quat2mat_loop)
+    posenorm_jit = njit(posenorm_loop)
+
+
 # -----------------------------------------------------------------------------
 # Load and parse a Model 3D file (this is WIP)
 def read_m3d(context,
@@ -114,57 +323,32 @@ def write_m3d(context,
               use_skeleton=True,  # save bind-pose armature
               use_animation=True,  # save skeletal animations
               use_markers=False,  # use timeline markers for animations
+              use_keyframes=False,  # only sample frames with keyframes on them
               use_fps=25,  # frame per second
               use_quality='-1',  # -1: auto, 0: 8 bit, 1: 16 bit, 2: 32 bit, 3: 64 bit
               use_inline=False,  # inline textures
               use_gridcompress=True,  # use lossy grid compression
               use_strmcompress=True,  # use lossless stream compression
+              use_complevel=6,  # deflate level of stream compression (1: fastest, 9: smallest)
               use_ascii=False,  # save ASCII variant
               use_relbones=True,  # (debug only) use parent relative bone positions
               global_matrix=None,  # default orientation
               check_existing=True,
               ):
     # convert string to name identifier
+    # (cached, as the same bone and material names come up over and over)
+    @lru_cache(maxsize=None)
     def safestr(name, morelines=0):
         if name is None:
             return ''
         elif morelines == 3:
-            return name.replace('\r', '').strip()
+            return name.translate(safestr_cr).strip()
         elif morelines == 2:
-            return name.replace('\r', '').replace('\n', ' ').strip()
+            return name.translate(safestr_line).strip()
         elif morelines == 1:
-            return name.replace('\r', '').replace('\n', '\r\n').strip()
+            return name.translate(safestr_crlf).strip()
         else:
-            return name.replace(' ', '_').replace('/', '_').replace('\\', '_').replace('\r', '').replace('\n',
-                                                                                                         ' ').strip()
-
-    # set is unique, but has no index, list has index, but not unique...
-    # this is utterly and painfully slow, hence the dict wrapper below
-    def uniquelist(l, e):
-        try:
-            i = l.index(e)
-        except ValueError:
-            i = len(l)
-            l.append(e)
-        return i
-
-    # use hash table and then convert dict to list instead
-    # this uses considerably more memory, but we have no choice:
-    # using uniquelist takes several minutes with 50000 triangles...
-    def uniquedict(l, e):
-        h = hash(str(e))
-        try:
-            return l[h][0]
-        except KeyError:
-            i = len(l)
-            l[h] = [i, e]
-        return i
-
-    def dict2list(l):
-        r = []
-        for i, v in l.items():
-            r.insert(v[0], v[1])
-        return r
+            return name.translate(safestr_name).strip()
 
     # get index size (we use -1 and -2 as special indices)
     def idxsize(cnt):
@@ -179,60 +363,68 @@ def write_m3d(context,
     # write out an index
     def addidx(fmt, idx):
         # we rely on the fact that in C -1 is a full binary 1 which
-        # gives the maximum unsigned value regardless to size, but
-        # pack stops us from taking advantage of that
-        if fmt == 0:
-            if idx < 0:
-                idx = 256 + idx
-            return pack("<B", idx)
-        elif fmt == 1:
-            if idx < 0:
-                idx = 65536 + idx
-            return pack("<H", idx)
-        elif fmt == 2:
-            if idx < 0:
-                idx = 4294967296 + idx
-            return pack("<I", idx)
+        # gives the maximum unsigned value regardless to size, pack
+        # stops us from taking advantage of that, but masking does not
+        if fmt < 3:
+            return idx_packers[fmt](idx & idx_masks[fmt])
         return b''
 
-    # eliminate minus zero
-    def vert(x, y, z, w, c, s):
-        if x == -0.0:
-            x = 0.0
-        if y == -0.0:
-            y = 0.0
-        if z == -0.0:
-            z = 0.0
-        if w == -0.0:
-            w = 0.0
-        return [x, y, z, w, c, s]
+    # same as addidx, but with the index size decided in advance (for loops)
+    def idxwriter(fmt):
+        if fmt < 3:
+            p = idx_packers[fmt]
+            m = idx_masks[fmt]
+            return lambda idx: p(idx & m)
+        return lambda idx: b''
+
+    # same as setdefault, but for every row of an array at once. np.unique
+    # does the heavy lifting, so only the unique rows are hashed in python
+    # (in the order of their first occurrence), returns the index per row
+    def uniquerows(l, arr):
+        if len(arr) < 1:
+            return np.empty(0, dtype=np.int64)
+        rows, first, inv = np.unique(arr, axis=0, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        idx = np.empty(len(rows), dtype=np.int64)
+        lset = l.setdefault
+        idx[order] = [lset(tuple(r), len(l)) for r in rows[order].tolist()]
+        return idx[inv.reshape(-1)]
+
+    # colors are stored as 8 bit RGBA
+    def rgba(c):
+        return tuple(int(min(max(x * 255.0 + 0.5, 0.0), 255.0)) for x in c)
 
     # normalize matrix, decompose and recompose to eliminate errors
     def matnorm(a):
         p, q, s = a.decompose()
         q.normalize()
-        return Matrix.Translation(p) @ q.to_matrix().to_4x4()
+        # same as Matrix.Translation(p) @ rotation, without the extra matrices
+        m = q.to_matrix().to_4x4()
+        m.translation = p
+        return m
 
     def img_to_png(image):
         width = image.size[0]
         height = image.size[1]
-        buf = bytearray([int(p * 255) for p in image.pixels])
+        pixels = np.empty(len(image.pixels), dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+        pixels *= 255.0
+        np.clip(pixels, 0.0, 255.0, out=pixels)
+        buf = pixels.astype(np.uint8).reshape(height, width * 4)[::-1]
 
         # reverse the vertical line order and add null bytes at the start
-        width_byte_4 = width * 4
-        raw_data = b''.join(b'\x00' + buf[span:span + width_byte_4]
-                            for span in range((height - 1) * width_byte_4, -1, - width_byte_4))
+        raw_data = np.concatenate((np.zeros((height, 1), dtype=np.uint8), buf), axis=1).tobytes()
 
         def png_pack(png_tag, data):
             chunk_head = png_tag + data
             return (pack("!I", len(data)) +
                     chunk_head +
-                    pack("!I", 0xFFFFFFFF & zlib.crc32(chunk_head)))
+                    pack("!I", 0xFFFFFFFF & zlib_fast.crc32(chunk_head)))
 
         png_bytes = b''.join([
             b'\x89PNG\r\n\x1a\n',
             png_pack(b'IHDR', pack("!2I5B", width, height, 8, 6, 0, 0, 0)),
-            png_pack(b'IDAT', zlib.compress(raw_data, 1)),
+            png_pack(b'IDAT', zlib_fast.compress(raw_data, 1)),
             png_pack(b'IEND', b'')])
 
         return png_bytes
@@ -291,6 +483,8 @@ def write_m3d(context,
             use_skeleton = True
         if use_fps < 1 or use_fps > 120:
             use_fps = 25
+        if use_complevel < 1 or use_complevel > 9:
+            use_complevel = 6
 
         # Get Blender objects to export
         scene = context.scene
@@ -322,6 +516,7 @@ def write_m3d(context,
             digits = 7
         else:
             digits = 4
+        grid = 10 ** digits
 
         # Build global lists with unique elements
         # we use a dict wrapper to speed up things
@@ -329,7 +524,12 @@ def write_m3d(context,
         strs = {}  # string table with unique strings
         verts = {}  # unique list of vertices
         tmaps = {}  # texture map UV coordinates
-        faces = []  # triangles list
+        # triangles as parallel arrays of material strids, vertexids, tmapids and
+        # normalvertexids (collected one array per mesh, concatenated when sorted)
+        face_m = [np.empty(0, dtype=np.int64)]
+        face_v = [np.empty((0, 3), dtype=np.int64)]
+        face_t = [np.empty((0, 3), dtype=np.int64)]
+        face_n = [np.empty((0, 3), dtype=np.int64)]
         labels = []  # annotation labels
         materials = []  # translated material name and properties
         bones = {}  # bind-pose skeleton
@@ -364,27 +564,28 @@ def write_m3d(context,
             for i, ob_main in enumerate(objects):
                 if ob_main.type != "ARMATURE":
                     continue
-                for b in ob_main.data.bones:
-                    m = matnorm(global_matrix @ ob_main.matrix_world @ b.matrix_local)
+                world = global_matrix @ ob_main.matrix_world
+                # parent's index in the armature's bone collection
+                bone_index = {b.name: j for j, b in enumerate(ob_main.data.bones)}
+                # model-space matrices, calculated once as parents are shared
+                bone_mats = [matnorm(world @ b.matrix_local) for b in ob_main.data.bones]
+                bone_invs = {}  # inverted parent matrices
+                for j, b in enumerate(ob_main.data.bones):
+                    m = bone_mats[j]
                     a = -1
                     if b.parent:
-                        # is there a better way to get the parent's
-                        # index in the armature's bone collection?
-                        for j, p in enumerate(ob_main.data.bones):
-                            if p == b.parent:
-                                a = j
-                                break
+                        a = bone_index[b.parent.name]
                         if use_relbones == True:
-                            p = matnorm(global_matrix @ ob_main.matrix_world @ b.parent.matrix_local)
-                            m = p.inverted() @ m
+                            if a not in bone_invs:
+                                bone_invs[a] = bone_mats[a].inverted()
+                            m = bone_invs[a] @ m
                     # For the top level bones, we need model-space p,q
                     # for the children, parent relative p,q
                     p = m.to_translation()  # position
                     q = m.to_quaternion()  # orientation
                     q.normalize()
                     n = safestr(b.name)
-                    try:
-                        ni = strs[hash(str(n))][0]
+                    if n in strs:
                         name = "'" + b.name + "'"
                         if b.name != n:
                             name += " (" + n + ")"
@@ -393,18 +594,12 @@ def write_m3d(context,
                         use_animation = False
                         bones = {}
                         break
-                    except:
-                        pass
-                    bones[b.name] = [idx, [a, uniquedict(strs, n),
-                                           uniquedict(verts, vert(
-                                               round(p[0], digits),
-                                               round(p[1], digits),
-                                               round(p[2], digits), 1.0, 0, -1)),
-                                           uniquedict(verts, vert(
-                                               round(q.x, digits),
-                                               round(q.y, digits),
-                                               round(q.z, digits),
-                                               round(q.w, digits), 0, -2))]]
+                    # vertices are plain tuples quantized to the grid of significant digits,
+                    # integers are faster to hash and there's no minus zero to eliminate either
+                    p = (round(p[0] * grid), round(p[1] * grid), round(p[2] * grid), grid, 0, -1)
+                    q = (round(q.x * grid), round(q.y * grid), round(q.z * grid), round(q.w * grid), 0, -2)
+                    bones[b.name] = [idx, [a, strs.setdefault(n, len(strs)),
+                                           verts.setdefault(p, len(verts)), verts.setdefault(q, len(verts))]]
                     idx = idx + 1
             if len(bones) < 1 and use_animation:
                 report({"WARNING"}, "Skipping skeletal animation in lack of armature.")
@@ -414,6 +609,7 @@ def write_m3d(context,
 
         ### Mesh data ###
         depsgraph = context.evaluated_depsgraph_get()
+        bm = None  # bmesh for triangulation, reused for all meshes
 
         for i, ob_main in enumerate(objects):
             if ob_main.parent and ob_main.parent.instance_type in {'VERTS', 'FACES'}:
@@ -434,18 +630,22 @@ def write_m3d(context,
                 if use_name is None or use_name == '':
                     use_name = ob.name
 
-                # Triangulate mesh (no effect if already triangulated)
-                bm = bmesh.new()
-                bm.from_mesh(mesh)
-                bmesh.ops.triangulate(bm, faces=bm.faces[:], quad_method='BEAUTY', ngon_method='BEAUTY')
-                bm.to_mesh(mesh)
-                bm.free()
+                # Triangulate mesh (skip the bmesh round-trip if already triangulated)
+                if len(mesh.loops) != 3 * len(mesh.polygons):
+                    if bm is None:
+                        bm = bmesh.new()
+                    else:
+                        bm.clear()
+                    bm.from_mesh(mesh)
+                    bmesh.ops.triangulate(bm, faces=bm.faces[:], quad_method='BEAUTY', ngon_method='BEAUTY')
+                    bm.to_mesh(mesh)
 
                 # transform vertices to model-space
                 mesh.transform(global_matrix @ ob_mat)
                 if ob_mat.determinant() < 0.0:
                     mesh.flip_normals()
-                if use_normals:
+                # since Blender 4.1 split normals are always available
+                if use_normals and hasattr(mesh, 'calc_normals_split'):
                     mesh.calc_normals_split()
 
                 if use_skeleton and len(ob.vertex_groups) > 0:
@@ -456,119 +656,156 @@ def write_m3d(context,
                         report({"ERROR"},
                                "Mesh '" + mesh.name + "' in object '" + ob.name + "' has no vertex groups, no skeletal animation possible!")
 
-                if use_uvs and len(mesh.uv_layers) > 0:
-                    uv_layer = mesh.uv_layers.active.data[:]
-                else:
-                    uv_layer = []
-
+                # fetch mesh data in bulk, accessing the collections element
+                # by element is what made this loop painfully slow
+                nl = len(mesh.loops)
+                vco = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+                mesh.vertices.foreach_get("co", vco)
+                vco = np.rint(vco.astype(np.float64) * grid).astype(np.int64).reshape(-1, 3)
+                loop_v = np.empty(nl, dtype=np.int32)
+                mesh.loops.foreach_get("vertex_index", loop_v)
+                poly_loop_start = np.empty(len(mesh.polygons), dtype=np.int32)
+                mesh.polygons.foreach_get("loop_start", poly_loop_start)
+                poly_mat = np.empty(len(mesh.polygons), dtype=np.int32)
+                mesh.polygons.foreach_get("material_index", poly_mat)
+
+                # colors (per loop)
+                loop_c = np.zeros(nl, dtype=np.int64)
                 if use_colors and len(mesh.vertex_colors) > 0:
                     active_col_layer = mesh.vertex_colors.active
                     if active_col_layer is not None and len(active_col_layer.data) > 0:
-                        vertex_colors = active_col_layer.data
-                else:
-                    vertex_colors = []
+                        cols = np.empty(nl * 4, dtype=np.float32)
+                        active_col_layer.data.foreach_get("color", cols)
+                        cols = np.clip(cols * 255.0 + 0.5, 0.0, 255.0).astype(np.uint8)
+                        loop_c = uniquerows(cmap, cols.reshape(-1, 4))
+
+                # skin (per vertex). Vertex groups are not available through
+                # foreach_get, so collect them in one pass into flat arrays
+                # and do the weight normalization in numpy
+                vert_s = np.full(len(mesh.vertices), -1, dtype=np.int64)
+                if use_skeleton and len(vg) > 0:
+                    vg_cnt = []
+                    vg_idx = []
+                    vg_w = []
+                    for v in mesh.vertices:
+                        groups = v.groups
+                        vg_cnt.append(len(groups))
+                        for g in groups:
+                            vg_idx.append(g.group)
+                            vg_w.append(g.weight)
+                    vg_idx = np.array(vg_idx, dtype=np.int64)
+                    vg_w = np.array(vg_w, dtype=np.float64)
+                    row = np.repeat(np.arange(len(vg_cnt)), vg_cnt)  # vertex index of each group
+                    wf = np.bincount(row, weights=vg_w, minlength=len(vg_cnt))
+                    # only vertices used by the faces get a skin, loose ones are skipped.
+                    # first_loop is where a vertex is used first (loop order, like the faces)
+                    used, first = np.unique(loop_v, return_index=True)
+                    first_loop = np.full(len(vg_cnt), nl, dtype=np.int64)
+                    first_loop[used] = first
+                    keep = (wf[row] > 0.0) & (first_loop[row] < nl)
+                    vg_idx = vg_idx[keep]
+                    row = row[keep]
+                    bid = np.array([bones[g.name][0] if g.name in bones else -1 for g in vg], dtype=np.int64)[vg_idx]
+                    bad = np.flatnonzero(bid < 0)
+                    if len(bad) > 0:
+                        bad = bad[np.argmin(first_loop[row[bad]])]
+                        report({"ERROR"},
+                               "Vertex group name '" + vg[int(vg_idx[bad])].name + "' does not match any bone.")
+                        use_skeleton = False
+                        vg = []
+                    elif len(row) > 0:
+                        s = np.rint(vg_w[keep] / wf[row] * 255.0)
+                        starts = np.flatnonzero(np.r_[True, row[1:] != row[:-1]])
+                        ends = np.r_[starts[1:], len(row)]
+                        # the first group with the largest weight gets the rounding error
+                        order = np.lexsort((-s, row))
+                        si = order[starts]
+                        s = s.clip(1, 255).astype(np.int64)
+                        s[si] += 255 - np.add.reduceat(s, starts)
+                        # one row of (bone, weight) pairs per vertex padded with -1, so that
+                        # np.unique can find the different skins and only those are hashed
+                        cnt = ends - starts
+                        nb_m = max(nb_m, int(cnt.max()))
+                        col = 2 * (np.arange(len(row)) - np.repeat(starts, cnt))
+                        pairs = np.full((len(starts), 2 * int(cnt.max())), -1, dtype=np.int64)
+                        pairs[np.repeat(np.arange(len(starts)), cnt), col] = bid
+                        pairs[np.repeat(np.arange(len(starts)), cnt), col + 1] = s
+                        rows, first, inv = np.unique(pairs, axis=0, return_index=True, return_inverse=True)
+                        inv = inv.reshape(-1)
+                        # new skins are added in the order the faces first use them
+                        firstuse = np.full(len(rows), nl, dtype=np.int64)
+                        np.minimum.at(firstuse, inv, first_loop[row[starts]])
+                        order = np.argsort(firstuse, kind='stable')
+                        idx = np.empty(len(rows), dtype=np.int64)
+                        idx[order] = [skins.setdefault(tuple(zip(r[0:2 * n:2], r[1:2 * n:2])), len(skins))
+                                      for r, n in zip(rows[order].tolist(), cnt[first[order]].tolist())]
+                        vert_s[row[starts]] = idx[inv]
+
+                # vertices (per loop, as the color is part of the vertex)
+                loop_vid = uniquerows(verts, np.column_stack((
+                    vco[loop_v], np.full(nl, grid, dtype=np.int64), loop_c, vert_s[loop_v])))
+
+                loop_nid = None
+                if use_normals:
+                    normals = np.empty(nl * 3, dtype=np.float32)
+                    mesh.loops.foreach_get("normal", normals)
+                    normals = normals.astype(np.float64).reshape(-1, 3)
+                    normals /= np.linalg.norm(normals, axis=1, keepdims=True).clip(1e-20)
+                    normals = np.rint(normals * grid).astype(np.int64)
+                    loop_nid = uniquerows(verts, np.column_stack((
+                        normals, np.full(nl, grid, dtype=np.int64),
+                        np.zeros(nl, dtype=np.int64), np.full(nl, -1, dtype=np.int64))))
+
+                loop_tid = None
+                if use_uvs and len(mesh.uv_layers) > 0:
+                    uvs = np.empty(nl * 2, dtype=np.float32)
+                    mesh.uv_layers.active.data.foreach_get("uv", uvs)
+                    loop_tid = uniquerows(tmaps, uvs.reshape(-1, 2))
 
                 matnames = []
                 if use_materials:
-                    for m in mesh.materials[:]:
-                        if m and m.name:
-                            matnames.append(uniquedict(strs, safestr(m.name)))
-                        else:
-                            matnames.append(-1)
-
-                # vertices and faces
-                badref = {}
-                for pi, poly in enumerate(mesh.polygons):
-                    face = [-1, [-1, -1, -1], [-1, -1, -1], [-1, -1, -1]]
-                    if len(matnames) > 0:
-                        if poly.material_index < len(matnames):
-                            i = poly.material_index
-                        else:
-                            i = 0
-                            # workaround to report each bad material index only once
-                            try:
-                                dummy = badref[poly.material_index]
-                            except:
-                                badref[poly.material_index] = 1
-                                report({"ERROR"},
-                                       "Polygon face in mesh '" + mesh.name + "' referencing a non-existent material (index " + str(
-                                           poly.material_index) + ", largest can be " + str(len(matnames) - 1) + ").")
-                        if i >= 0:
-                            face[0] = matnames[i]
-                            uniquedict(refmats, mesh.materials[i])
-                    for i, li in enumerate(poly.loop_indices):
-                        if len(vertex_colors) > 0:
-                            c = uniquedict(cmap,
-                                           [vertex_colors[li].color[0], vertex_colors[li].color[1],
-                                            vertex_colors[li].color[2], vertex_colors[li].color[3]])
-                        else:
-                            c = 0
-                        v = mesh.vertices[poly.vertices[i]]
-                        if use_skeleton and len(vg) > 0 and len(v.groups) > 0:
-                            wf = 0.0
-                            for g in v.groups:
-                                wf += g.weight
-                            if wf > 0.0:
-                                skin = []
-                                w = wi = wm = 0
-                                for g in v.groups:
-                                    try:
-                                        s = round(g.weight / wf * 255.0)
-                                        if s > wm:
-                                            wm = s
-                                            si = len(skin)
-                                        if s < 1:
-                                            s = 1
-                                        if s > 255:
-                                            s = 255
-                                        skin.append([bones[vg[g.group].name][0], s])
-                                        w = w + s
-                                    except:
-                                        report({"ERROR"},
-                                               "Vertex group name '" + vg[g.group].name + "' does not match any bone.")
-                                        use_skeleton = False
-                                        vg = []
-                                        s = -1
-                                        break
-                                try:
-                                    if w != 255:
-                                        skin[si][1] += 255 - w
-                                except:
-                                    pass
-                                s = uniquedict(skins, skin)
-                                if len(skin) > nb_m:
-                                    nb_m = len(skin)
-                            else:
-                                s = -1
-                        else:
-                            s = -1
-                        face[1][i] = uniquedict(verts, vert(
-                            round(v.co.x, digits),
-                            round(v.co.y, digits),
-                            round(v.co.z, digits), 1.0, c, s))
-                        if use_normals:
-                            try:
-                                no = v.normal
-                            except:
-                                no = poly.loops[i].normal
-                            no = no.normalized()  # also copies vector
-                            face[3][i] = uniquedict(verts, vert(
-                                round(no.x, digits),
-                                round(no.y, digits),
-                                round(no.z, digits), 1.0, 0, -1))
-                            del no
-                        if use_uvs and len(uv_layer) > 0:
-                            face[2][i] = uniquedict(tmaps, list(uv_layer[li].uv[:]))
-                    faces.append(face)
-        faces.sort(key=itemgetter(0)) # group by material
+                    matnames = [strs.setdefault(safestr(m.name), len(strs)) if m and m.name else -1
+                                for m in mesh.materials]
+
+                # faces
+                if len(matnames) > 0:
+                    # report each bad material index only once
+                    bad = poly_mat >= len(matnames)
+                    for mi in np.unique(poly_mat[bad]).tolist():
+                        report({"ERROR"},
+                               "Polygon face in mesh '" + mesh.name + "' referencing a non-existent material (index " + str(
+                                   mi) + ", largest can be " + str(len(matnames) - 1) + ").")
+                    poly_mat[bad] = 0
+                    # referenced materials, in order of first use
+                    used, first = np.unique(poly_mat, return_index=True)
+                    for mi in used[np.argsort(first)].tolist():
+                        refmats.setdefault(mesh.materials[mi], len(refmats))
+                    face_m.append(np.array(matnames, dtype=np.int64)[poly_mat])
+                else:
+                    face_m.append(np.full(len(poly_mat), -1, dtype=np.int64))
+                # loop indices of the triangles' corners
+                tri = poly_loop_start.astype(np.int64)[:, None] + np.arange(3)
+                face_v.append(loop_vid[tri])
+                face_t.append(loop_tid[tri] if loop_tid is not None else np.full(tri.shape, -1, dtype=np.int64))
+                face_n.append(loop_nid[tri] if loop_nid is not None else np.full(tri.shape, -1, dtype=np.int64))
+
+        if bm is not None:
+            bm.free()
+
+        # group by material, stable sort so faces keep their order within a group
+        face_m = np.concatenate(face_m)
+        order = np.argsort(face_m, kind='stable')
+        face_m = face_m[order]
+        face_v = np.concatenate(face_v)[order]
+        face_t = np.concatenate(face_t)[order]
+        face_n = np.concatenate(face_n)[order]
+        del order
 
         bpy.context.window_manager.progress_update(40)
 
         ### Materials ###
         if use_materials:
-            for i, v in refmats.items():
-                mi = v[0]
-                mat = v[1]
+            for mat in refmats:
                 if mat is not None:
                     props = {}
                     if mat.node_tree:
@@ -578,9 +815,9 @@ def write_m3d(context,
                             if n.type == 'TEX_IMAGE' and n.image and n.image.name != "":
                                 data = get_texturedata(n.image, use_inline)
 
-                                s = uniquedict(strs, n.image.name)
+                                s = strs.setdefault(n.image.name, len(strs))
                                 if use_inline and len(data) > 8:
-                                    uniquedict(inlined, [s, data])
+                                    inlined.setdefault((s, data), len(inlined))
                                 props[128] = [128, s]
                                 break
                     # otherwise properly parse material if blender can convert it into PrincipledBSDF
@@ -596,8 +833,8 @@ def write_m3d(context,
                                 else:
                                     d = 0.0
                                 if d != 0.0:
-                                    props[0] = [0, uniquedict(cmap, [mat_wrap.base_color[0], mat_wrap.base_color[1],
-                                                                     mat_wrap.base_color[2], d])]
+                                    props[0] = [0, cmap.setdefault(rgba((mat_wrap.base_color[0], mat_wrap.base_color[1],
+                                                                         mat_wrap.base_color[2], d)), len(cmap))]
                             elif key == 8:
                                 # il
                                 il = 0
@@ -630,16 +867,16 @@ def write_m3d(context,
                                 if val.image is None or val.image.name == "":
                                     continue
                                 data = get_texturedata(val.image, use_inline)
-                                s = uniquedict(strs, val.image.name)
+                                s = strs.setdefault(val.image.name, len(strs))
                                 props[key] = [key, s]
                                 if use_inline and len(data) > 8:
-                                    uniquedict(inlined, [s, data])
+                                    inlined.setdefault((s, data), len(inlined))
                             elif mat_wrap_key[0] == "gscale" and val != 0.0:
-                                props[key] = [key, uniquedict(cmap, [val, val, val, 1.0])]
+                                props[key] = [key, cmap.setdefault(rgba((val, val, val, 1.0)), len(cmap))]
                             elif mat_wrap_key[0] == "color" and len(val) == 3:
-                                props[key] = [key, uniquedict(cmap, [val[0], val[1], val[2], 1.0])]
+                                props[key] = [key, cmap.setdefault(rgba((val[0], val[1], val[2], 1.0)), len(cmap))]
                             elif mat_wrap_key[0] == "color" and len(val) == 4:
-                                props[key] = [key, uniquedict(cmap, val)]
+                                props[key] = [key, cmap.setdefault(rgba(val), len(cmap))]
                             elif mat_wrap_key[0] == "float" and val != 0.0:
                                 props[key] = [key, val]
                             elif (mat_wrap_key[0] == "byte" or mat_wrap_key[0] == "int") and val != 0:
@@ -649,7 +886,7 @@ def write_m3d(context,
                                "Material '" + mat.name + "' does not use PrincipledBSDF surface, not parsing.")
                     # append material if it has at least one property
                     if len(props) > 0:
-                        materials.append([uniquedict(strs, safestr(mat.name)), props])
+                        materials.append([strs.setdefault(safestr(mat.name), len(strs)), props])
 
         bpy.context.window_manager.progress_update(60)
 
@@ -691,6 +928,24 @@ def write_m3d(context,
                     acts.append(["Anim", -1, scene.frame_start, scene.frame_end])
                     nf = scene.frame_end - scene.frame_start
                 # ok, now 'acts' is an array of [action name, action pose index, start frame, end frame]
+                # the bone hierarchy does not change between frames, so look up the pose bones and
+                # their parent indices only once per armature, not on every frame
+                rigs = []
+                for i, ob_main in enumerate(objects):
+                    if ob_main.type != "ARMATURE":
+                        continue
+                    pose_bones = ob_main.pose.bones
+                    parents = None
+                    if use_relbones == True:
+                        bone_index = {b.name: j for j, b in enumerate(pose_bones)}
+                        parents = np.array([bone_index[b.parent.name] if b.parent else -1 for b in pose_bones],
+                                           dtype=np.int64)
+                    rigs.append([ob_main, pose_bones, [b.name for b in pose_bones], parents,
+                                 np.empty(len(pose_bones) * 16, dtype=np.float32)])
+                    # drivers and constraints move bones between keyframes too
+                    if ob_main.animation_data and len(ob_main.animation_data.drivers) > 0 or \
+                            any(len(b.constraints) > 0 for b in pose_bones):
+                        use_keyframes = False
                 for a in acts:
                     # set action pose
                     scene.frame_set(0, subframe=0.0)
@@ -705,55 +960,58 @@ def write_m3d(context,
                     frames = []  # collect frame with changed bones for this action
                     lastpose = {}  # fill up with bind pose on start
                     for n, b in bones.items():
-                        lastpose[n] = [b[1][2], b[1][3]]
+                        lastpose[n] = (b[1][2], b[1][3])
+                    # local bindings for the per bone per frame loop
+                    vset = verts.setdefault
+                    vlen = verts.__len__
+                    bones_get = bones.get
                     # iterate through each frame, and set anim pose for the armature
-                    for frame in range(a[2], a[3] + 1):
+                    frame_list = range(a[2], a[3] + 1)
+                    if use_keyframes == True and a[1] != -1 and hasattr(bpy_actions[a[1]], 'fcurves'):
+                        # or just through the keyed ones, plus the first and last frame
+                        keys = {int(round(k.co.x)) for fc in bpy_actions[a[1]].fcurves for k in fc.keyframe_points}
+                        if len(keys) > 0:
+                            frame_list = sorted({a[2], a[3]} | {k for k in keys if a[2] < k < a[3]})
+                    for frame in frame_list:
                         scene.frame_set(frame, subframe=0.0)
                         # walk through the bones in anim pose, collect which one changed
                         changed = []
-                        for i, ob_main in enumerate(objects):
-                            if ob_main.type != "ARMATURE":
-                                continue
-                            for i, b in enumerate(ob_main.pose.bones):
-                                try:
-                                    idx = bones[b.name][0]
-                                except:
+                        add = changed.append
+                        for ob_main, pose_bones, names, parents, mats in rigs:
+                            # get all bone matrices at once (flattened column major), the
+                            # armature's world matrix is only multiplied in once per frame
+                            pose_bones.foreach_get("matrix", mats)
+                            world = np.array(global_matrix @ ob_main.matrix_world)
+                            # we need model-space p,q only for bones without parents
+                            locs, rots = posenorm(world @ mats.reshape(-1, 4, 4).transpose(0, 2, 1).astype(np.float64),
+                                                  parents)
+                            locs = np.rint(locs * grid).astype(np.int64).tolist()
+                            rots = np.rint(rots * grid).astype(np.int64).tolist()
+                            for n, p, q in zip(names, locs, rots):
+                                idx = bones_get(n)
+                                if idx is None:
                                     report({"ERROR"},
-                                           "Animated bone name '" + b.name + "' does not match any bind-pose bone???")
+                                           "Animated bone name '" + n + "' does not match any bind-pose bone???")
                                     break
-                                # we need model-space p,q only for bones without parents
-                                m = matnorm(global_matrix @ ob_main.matrix_world @ b.matrix)
-                                if use_relbones == True and b.parent:
-                                    p = matnorm(global_matrix @ ob_main.matrix_world @ b.parent.matrix)
-                                    m = p.inverted() @ m
-                                p = m.to_translation()
-                                q = m.to_quaternion()
-                                q.normalize()
+                                idx = idx[0]
                                 # differerent?
-                                pos = uniquedict(verts, vert(
-                                    round(p[0], digits),
-                                    round(p[1], digits),
-                                    round(p[2], digits), 1.0, 0, -1))
-                                ori = uniquedict(verts, vert(
-                                    round(q.x, digits),
-                                    round(q.y, digits),
-                                    round(q.z, digits),
-                                    round(q.w, digits), 0, -2))
-                                if lastpose[b.name][0] != pos or lastpose[b.name][1] != ori:
-                                    changed.append([idx, pos, ori])
-                                    lastpose[b.name][0] = pos
-                                    lastpose[b.name][1] = ori
+                                pos = vset((p[0], p[1], p[2], grid, 0, -1), vlen())
+                                ori = vset((q[0], q[1], q[2], q[3], 0, -2), vlen())
+                                cur = (pos, ori)
+                                if lastpose[n] != cur:
+                                    add((idx, pos, ori))
+                                    lastpose[n] = cur
                         # do we have changed bones on this frame?
                         if len(changed) > 0:
                             if len(frames) < 1:
                                 a[2] = frame
-                            frames.append([int((frame - a[2]) * mpf), changed])
+                            frames.append([int((frame - a[2]) * mpf), np.array(changed, dtype=np.int64)])
                             lf = frame
                             if len(changed) > fi_m:
                                 fi_m = len(changed)
                     # if the action has at least one frame, save it
                     if len(frames) > 0:
-                        actions.append([uniquedict(strs, safestr(a[0])), int((lf - a[2] + 1) * mpf), frames])
+                        actions.append([strs.setdefault(safestr(a[0]), len(strs)), int((lf - a[2] + 1) * mpf), frames])
             else:
                 report({"ERROR"}, "Trying to export animations without armature and skin")
         # restore original armature
@@ -771,38 +1029,46 @@ def write_m3d(context,
         bpy.context.window_manager.progress_update(75)
 
         # we need lists, but creating unique lists in python is impossible, so we
-        # have used dictionaries. Let's convert those into lists now
-        cmap = dict2list(cmap)
-        strs = dict2list(strs)
-        verts = dict2list(verts)
-        tmaps = dict2list(tmaps)
-        bones = dict2list(bones)
-        skins = dict2list(skins)
-        inlined = dict2list(inlined)
+        # have used dictionaries (element -> index, added with d.setdefault(e, len(d))).
+        # Let's convert those into lists now (dicts keep insertion order, and the
+        # indices were assigned in that order too)
+        cmap = list(cmap)
+        strs = list(strs)
+        # vertices were quantized to the grid, convert them back to floats. From here on they
+        # are kept in arrays, coordinates and the color and skin indices separately
+        verts = np.array(list(verts), dtype=np.int64).reshape(-1, 6)
+        vert_cs = verts[:, 4:]
+        verts = verts[:, :4] / grid
+        tmaps = list(tmaps)
+        bones = [b[1] for b in bones.values()]
+        skins = list(skins)
+        inlined = list(inlined)
         # ----------------- End of Blender Specific Stuff ---------------------
 
         # Now we should have:
-        #  cmap = array of [r, g, b, a]
+        #  cmap = array of [r, g, b, a] (0..255)
         #  strs = array of unique strings
-        #  verts = array of [x, y, z, w, color, skinid]
+        #  verts = array of [x, y, z, w]
+        #  vert_cs = array of [color, skinid] per vertex
         #  tmaps = array of [u, v]
-        #  faces = array of [material strid, [3] vertexids, [3] normalvertexids, [3] tmapids }
+        #  face_m = array of material strid per triangle
+        #  face_v, face_t, face_n = arrays of [3] vertexids, [3] tmapids, [3] normalvertexids per triangle
         #  shapes =
         #  labels =
         #  materials = array of [material strid, dict of [property type, property value]]
         #  bones = array of [parent, name strid, pos vertexid, ori vertexid]
         #  skins = array of [[boneid, weight] * 8]
         #  actions = array of [action name strid, durationmsec, array of animation frames]
-        #    anim frame = [timestampmsec, array of [boneid, pos vertexid, ori vertexid]]
+        #    anim frame = [timestampmsec, int array of [boneid, pos vertexid, ori vertexid] rows]
         #  inlined = array of [name strid, bytes data]
         #  extras = array of [bytes[4] magic, bytes data]
 
         # print("----------------------------------------------")
         # print(cmap)
         # print(strs)
-        # print(verts)
+        # print(verts, vert_cs)
         # print(tmaps)
-        # print(faces)
+        # print(face_m, face_v, face_t, face_n)
         # print(shapes)
         # print(labels)
         # print(materials)
@@ -815,35 +1081,25 @@ def write_m3d(context,
 
         # normalize coordinates
         if use_gridcompress == True:
-            min_x = min_y = min_z = 1e10
-            max_x = max_y = max_z = -1e10
-            for v in verts:
-                if v[0] < min_x:
-                    min_x = v[0]
-                if v[0] > max_x:
-                    max_x = v[0]
-                if v[1] < min_y:
-                    min_y = v[1]
-                if v[1] > max_y:
-                    max_y = v[1]
-                if v[2] < min_z:
-                    min_z = v[2]
-                if v[2] > max_z:
-                    max_z = v[2]
-            s = max(abs(min_x), abs(max_x), abs(min_y), abs(max_y), abs(min_z), abs(max_z))
+            s = float(np.abs(verts[:, :3]).max()) if len(verts) > 0 else 1e10
             if s != 1.0 and s != 0.0:
-                for i, v in enumerate(verts):
-                    if verts[i][5] != -2:
-                        verts[i][0] = round(verts[i][0] / s, digits)
-                        verts[i][1] = round(verts[i][1] / s, digits)
-                        verts[i][2] = round(verts[i][2] / s, digits)
+                # orientation quaternions are not coordinates, leave them as-is
+                c = vert_cs[:, 1] != -2
+                verts[c, :3] = np.round(verts[c, :3] / s, digits)
             if use_scale <= 0.0:
                 use_scale = s
         if use_scale <= 0.0:
             use_scale = 1.0
 
+        # failsafes, clamp texture coordinates to 0..1 (same for both variants)
+        if len(tmaps) > 0 and not allow_unnormalized_uvs:
+            t = np.array(tmaps, dtype=np.float64)
+            if t.min() < 0.0 or t.max() > 1.0:
+                report({"ERROR"}, "Texture UV's are out of 0..1 range")
+                tmaps = [tuple(t) for t in np.clip(t, 0.0, 1.0).tolist()]
+
         # Construct chunks buffer from lists
-        print(len(verts), "verts,", len(faces), "faces,", len(tmaps), "UVs", len(materials), "materials,", len(bones),
+        print(len(verts), "verts,", len(face_m), "faces,", len(tmaps), "UVs", len(materials), "materials,", len(bones),
               "bones,", len(skins), "skins,", len(actions), "actions")
 
         # create string table and calculate string offsets
@@ -851,147 +1107,140 @@ def write_m3d(context,
             use_author = os.getenv("LOGNAME", "")
 
         if use_ascii == True:
-            # save Model 3D ASCII variant
-            s = "3dmodel " + str(use_scale) + "\r\n"
-            s += safestr(use_name, 2) + "\r\n"
-            s += safestr(use_license, 2) + "\r\n"
-            s += safestr(use_author, 2) + "\r\n"
-            s += safestr(use_comment, 1) + "\r\n\r\n"
-
-            # materials
-            if len(materials) > 0:
-                for m in materials:
-                    s += "Material " + strs[m[0]] + "\r\n"
-                    for pi, p in m[1].items():
-                        t = mat_property_map[p[0]]
-                        s += t[2] + " "
-                        if t[0] == "color" or t[0] == "gscale":
-                            s += "#"
-                            for i in range(0, 4):
-                                s += "%02x" % (int(cmap[p[1]][3 - i] * 255.0))
-                        elif t[0] == "float":
-                            s += str(round(p[1], digits))
-                        elif p[0] >= 128:
-                            s += strs[p[1]]
-                        else:
-                            s += str(p[1])
-                        s += "\r\n"
-                    s += "\r\n"
-
-            # texture map
-            if len(tmaps) > 0:
-                s += "Textmap\r\n"
-                r = True
-                for t in tmaps:
-                    # failsafes
-                    if (t[0] < 0.0 or t[0] > 1.0 or t[1] < 0.0 or t[1] > 1.0) and not allow_unnormalized_uvs:
-                        if r:
-                            r = False
-                            report({"ERROR"}, "Texture UV's are out of 0..1 range")
-                        if t[0] > 1.0:
-                            t[0] = 1.0
-                        if t[0] < 0.0:
-                            t[0] = 0.0
-                        if t[1] > 1.0:
-                            t[1] = 1.0
-                        if t[1] < 0.0:
-                            t[1] = 0.0
-                    s += str(round(t[0], digits)) + " " + str(round(t[1], digits)) + "\r\n"
-                s += "\r\n"
-
-            # vertex list
-            if len(verts) > 0:
-                s += "Vertex\r\n"
-                for v in verts:
-                    s += str(v[0]) + " " + str(v[1]) + " " + str(v[2]) + " " + str(v[3])
-                    if 0 <= v[4] < len(cmap):
-                        s += " #"
-                        for i in range(0, 4):
-                            s += "%02x" % (int(cmap[v[4]][3 - i] * 255.0))
-                    elif 0 <= v[5] < len(skins):
-                        s += " #ffffffff"
-                    if 0 <= v[5] < len(skins):
-                        for i in range(0, min(len(skins[v[5]]), 8)):
-                            if skins[v[5]][i][0] != -1 and skins[v[5]][i][1] != 0:
-                                s += " " + str(skins[v[5]][i][0]) + ":" + str(
-                                    round(float(skins[v[5]][i][1]) / 255.0, 4))
-                    s += "\r\n"
-                s += "\r\n"
-
-            # triangle mesh
-            if len(faces) > 0:
-                s += "Mesh\r\n"
-                l = -1
-                for f in faces:
-                    if l != f[0]:
-                        l = f[0]
-                        if l == -1:
-                            s += "use\r\n"
-                        else:
-                            s += "use " + strs[l] + "\r\n"
-                    for i, v in enumerate(f[1]):
-                        if i != 0:
-                            s += " "
-                        s += str(v) + "/"
-                        if use_uvs:
-                            s += str(f[2][i])
-                        s += "/"
-                        if use_normals:
-                            s += str(f[3][i])
-                    s += "\r\n"
-                s += "\r\n"
-
-            # skeleton
-            if len(bones) > 0 or len(skins) > 0:
-                s += "Bones\r\n"
-                s += bonestr(strs, bones, -1, 0)
-                s += "\r\n"
-
-            # actions (animations)
-            if len(actions) > 0:
-                for a in actions:
-                    if len(a[2]) < 1:
-                        continue
-                    s += "Action " + str(a[1]) + " " + strs[a[0]] + "\r\n"
-                    for f in a[2]:
-                        s += "frame " + str(f[0]) + "\r\n"
-                        for t in f[1]:
-                            s += str(t[0]) + " " + str(t[1]) + " " + str(t[2]) + "\r\n"
-                    s += "\r\n"
-
-            # inlined assets
-            if len(inlined) > 0:
-                s += "Assets\r\n"
-                for i in inlined:
-                    s += strs[i[0]] + ".png\r\n"
-                s += "\r\n"
-
-            # write out file
+            # save Model 3D ASCII variant, written out line by line as it's
+            # produced instead of being collected in one huge string
             filepath = filepath[:len(filepath) - 4] + ".a3d"
             if use_strmcompress:
                 import gzip
-                # could have use gzip.open, but we need the compressed size too
-                s = gzip.compress(bytes(s, 'utf-8'), 9)
                 filepath += ".gz"
-                f = open(filepath, 'wb')
+                out = gzip.open(filepath, 'wt', use_complevel, encoding='utf-8', newline='')
             else:
-                f = open(filepath, 'w')
-            f.write(s)
-            f.close()
-            s = len(s)
+                out = open(filepath, 'w')
+            w = out.write
+            # a failure half way through must not leave a truncated model behind
+            try:
+                # fixed point format with the quality's number of digits
+                numfmt = "%." + str(digits) + "f"
+                w("3dmodel " + str(use_scale) + "\r\n")
+                w(safestr(use_name, 2) + "\r\n")
+                w(safestr(use_license, 2) + "\r\n")
+                w(safestr(use_author, 2) + "\r\n")
+                w(safestr(use_comment, 1) + "\r\n\r\n")
+
+                # materials
+                if len(materials) > 0:
+                    for m in materials:
+                        w("Material " + strs[m[0]] + "\r\n")
+                        for pi, p in m[1].items():
+                            t = mat_property_map[p[0]]
+                            w(t[2] + " ")
+                            if t[0] == "color" or t[0] == "gscale":
+                                w("#")
+                                for i in range(0, 4):
+                                    w("%02x" % cmap[p[1]][3 - i])
+                            elif t[0] == "float":
+                                w(numfmt % p[1])
+                            elif p[0] >= 128:
+                                w(strs[p[1]])
+                            else:
+                                w(str(p[1]))
+                            w("\r\n")
+                        w("\r\n")
+
+                # texture map
+                if len(tmaps) > 0:
+                    w("Textmap\r\n")
+                    uvfmt = numfmt + " " + numfmt + "\r\n"
+                    for t in tmaps:
+                        w(uvfmt % (t[0], t[1]))
+                    w("\r\n")
+
+                # vertex list
+                if len(verts) > 0:
+                    w("Vertex\r\n")
+                    for v, (vc, vs) in zip(verts.tolist(), vert_cs.tolist()):
+                        line = [str(v[0]), " ", str(v[1]), " ", str(v[2]), " ", str(v[3])]
+                        if 0 <= vc < len(cmap):
+                            line.append(" #")
+                            for i in range(0, 4):
+                                line.append("%02x" % cmap[vc][3 - i])
+                        elif 0 <= vs < len(skins):
+                            line.append(" #ffffffff")
+                        if 0 <= vs < len(skins):
+                            for i in range(0, min(len(skins[vs]), 8)):
+                                if skins[vs][i][0] != -1 and skins[vs][i][1] != 0:
+                                    line.append(" %d:%.4f" % (skins[vs][i][0], skins[vs][i][1] / 255.0))
+                        line.append("\r\n")
+                        w("".join(line))
+                    w("\r\n")
+
+                # triangle mesh
+                if len(face_m) > 0:
+                    w("Mesh\r\n")
+                    l = -1
+                    for fm, fv, ft, fn in zip(face_m.tolist(), face_v.tolist(), face_t.tolist(), face_n.tolist()):
+                        if l != fm:
+                            l = fm
+                            if l == -1:
+                                w("use\r\n")
+                            else:
+                                w("use " + strs[l] + "\r\n")
+                        line = []
+                        for i, v in enumerate(fv):
+                            line.append(str(v) + "/")
+                            if use_uvs:
+                                line[-1] += str(ft[i])
+                            line[-1] += "/"
+                            if use_normals:
+                                line[-1] += str(fn[i])
+                        w(" ".join(line) + "\r\n")
+                    w("\r\n")
+
+                # skeleton
+                if len(bones) > 0 or len(skins) > 0:
+                    w("Bones\r\n")
+                    w(bonestr(strs, bones, -1, 0))
+                    w("\r\n")
+
+                # actions (animations)
+                if len(actions) > 0:
+                    for a in actions:
+                        if len(a[2]) < 1:
+                            continue
+                        w("Action " + str(a[1]) + " " + strs[a[0]] + "\r\n")
+                        for f in a[2]:
+                            w("frame " + str(f[0]) + "\r\n")
+                            for t in f[1].tolist():
+                                w(str(t[0]) + " " + str(t[1]) + " " + str(t[2]) + "\r\n")
+                        w("\r\n")
+
+                # inlined assets
+                if len(inlined) > 0:
+                    w("Assets\r\n")
+                    for i in inlined:
+                        w(strs[i[0]] + ".png\r\n")
+                    w("\r\n")
+            except BaseException:
+                out.close()
+                os.remove(filepath)
+                raise
+
+            # the (compressed) size is only known once the file is closed
+            out.close()
+            s = os.path.getsize(filepath)
         else:
             # save Model 3D binary variant
+            # the string table is extended in place, bytes would be copied on every append
             stridx = [0] * (len(strs))
-            st = bytes(safestr(use_name, 2), 'utf-8') + pack("<b", 0)
-            st = st + bytes(safestr(use_license, 2), 'utf-8') + pack("<b", 0)
-            st = st + bytes(safestr(use_author, 2), 'utf-8') + pack("<b", 0)
-            st = st + bytes(safestr(use_comment, 1), 'utf-8') + pack("<b", 0)
-            o = len(st)
+            st = bytearray()
+            for s in (safestr(use_name, 2), safestr(use_license, 2), safestr(use_author, 2), safestr(use_comment, 1)):
+                st += s.encode('utf-8')
+                st.append(0)
             for i, s in enumerate(strs):
-                s = bytes(s, 'utf-8') + pack("<b", 0)
-                st = st + s
-                stridx[i] = o
-                o = o + len(s)
+                stridx[i] = len(st)
+                st += s.encode('utf-8')
+                st.append(0)
+            o = len(st)
 
             # construct model header chunk
             ci_s = idxsize(len(cmap))
@@ -1000,7 +1249,7 @@ def write_m3d(context,
             si_s = idxsize(o)
             bi_s = idxsize(len(bones))
             sk_s = idxsize(len(skins))
-            fi_s = idxsize(len(faces))
+            fi_s = idxsize(len(face_m))
             if nb_m < 2:
                 nb_s = 0
             elif nb_m == 2:
@@ -1013,83 +1262,63 @@ def write_m3d(context,
             flags = (use_quality << 0) | (vi_s << 2) | (si_s << 4) | (ci_s << 6) | (ti_s << 8) | (bi_s << 10) | (
                     nb_s << 12)
             flags |= (sk_s << 14) | (fc_s << 16) | (fi_s << 20)
-            buf = pack("<f", use_scale) + pack("<I", flags) + st
-            buf = b'HEAD' + pack("<I", len(buf) + 8) + buf
+            # the chunks are collected in a list, appending them to one buffer
+            # would copy everything written so far for each and every chunk
+            o = pack("<f", use_scale) + pack("<I", flags) + st
+            chunks = [b'HEAD' + pack("<I", len(o) + 8) + o]
 
             # color map
             if len(cmap) > 0 and ci_s < 4:
-                byte_list = []
-                for col in cmap:
-                    for i in range(4):
-                        byte_list.append(pack("<B", int(col[i] * 255)))
-                buf = buf + b'CMAP' + pack("<I", len(cmap) * 4 + 8) + b''.join(byte_list)
+                chunks.append(b'CMAP' + pack("<I", len(cmap) * 4 + 8) + b''.join(map(bytes, cmap)))
 
             # texture map
             if len(tmaps) > 0:
-                byte_list = []
-                r = True
-                for t in tmaps:
-                    # failsafes
-                    if (t[0] < 0.0 or t[0] > 1.0 or t[1] < 0.0 or t[1] > 1.0) and not allow_unnormalized_uvs:
-                        if r:
-                            r = False
-                            report({"ERROR"}, "Texture UV's are out of 0..1 range")
-                        t = [max(min(t[0], 1.0), 0.0), max(min(t[1], 1.0), 0.0)]
-                    if use_quality == 0:
-                        byte_list.append(pack("<BB", int(t[0] * 255), int(t[1] * 255)))
-                    elif use_quality == 1:
-                        byte_list.append(pack("<HH", int(t[0] * 65535), int(t[1] * 65535)))
-                    elif use_quality == 3:
-                        byte_list.append(pack("<dd", t[0], t[1]))
-                    else:
-                        byte_list.append(pack("<ff", t[0], t[1]))
-
-                buf = buf + b'TMAP' + pack("<I", len(tmaps) * 2 * (1 << use_quality) + 8) + b''.join(byte_list)
+                t = np.array(tmaps, dtype=np.float64)
+                if use_quality < 2:
+                    # truncate like int() does
+                    t = (t * uv_scales[use_quality]).astype(np.int64)
+                o = t.astype(uv_dtypes[use_quality]).tobytes()
+                chunks.append(b'TMAP' + pack("<I", len(o) + 8) + o)
 
             # vertex list
             if len(verts) > 0:
-                byte_list = []
-                for v in verts:
-                    if use_quality == 0:
-                        for i in range(4):
-                            byte_list.append(pack("<b", int(v[i] * 127)))
-                    elif use_quality == 1:
-                        for i in range(4):
-                            byte_list.append(pack("<h", int(v[i] * 32767)))
-                    elif use_quality == 3:
-                        for i in range(4):
-                            byte_list.append(pack("<d", v[i]))
-                    else:
-                        for i in range(4):
-                            byte_list.append(pack("<f", v[i]))
-
-                    if ci_s < 4:
-                        byte_list.append(addidx(ci_s, v[4]))
-                    else:
-                        byte_list.append(pack("<I", cmap[v[4]]))
-                    byte_list.append(addidx(sk_s, v[5]))
-
-                o = b''.join(byte_list)
-                buf = buf + b'VRTS' + pack("<I", len(o) + 8) + o
+                # one record per vertex, coordinates then color and skin index
+                fields = [("crd", crd_dtypes[use_quality], 4)]
+                if ci_s < 3:
+                    fields.append(("c", idx_dtypes[ci_s]))
+                if sk_s < 3:
+                    fields.append(("s", idx_dtypes[sk_s]))
+                o = np.empty(len(verts), dtype=fields)
+                if use_quality < 2:
+                    # truncate like int() does
+                    o["crd"] = (verts * crd_scales[use_quality]).astype(np.int64)
+                else:
+                    o["crd"] = verts
+                # masking makes -1 the maximum unsigned value, see addidx
+                if ci_s < 3:
+                    o["c"] = vert_cs[:, 0] & idx_masks[ci_s]
+                if sk_s < 3:
+                    o["s"] = vert_cs[:, 1] & idx_masks[sk_s]
+                o = o.tobytes()
+                chunks.append(b'VRTS' + pack("<I", len(o) + 8) + o)
 
             # skeleton
             if len(bones) > 0 or len(skins) > 0:
-                byte_list = [addidx(bi_s, len(bones)), addidx(sk_s, len(skins))]
+                wb = idxwriter(bi_s)
+                ws = idxwriter(si_s)
+                wv = idxwriter(vi_s)
+                byte_list = [wb(len(bones)), addidx(sk_s, len(skins))]
                 for b in bones:
-                    byte_list.extend(
-                        [addidx(bi_s, b[0]), addidx(si_s, stridx[b[1]]), addidx(vi_s, b[2]), addidx(vi_s, b[3])])
+                    byte_list.extend([wb(b[0]), ws(stridx[b[1]]), wv(b[2]), wv(b[3])])
                 for s in skins:
                     if nb_s > 0:
-                        for i in range(1 << nb_s):
-                            if i >= len(s):
-                                byte_list.append(pack("<B", 0))
-                            else:
-                                byte_list.append(pack("<B", s[i][1]))
+                        # weights padded with zeros
+                        byte_list.append(bytes([w for _, w in s[:1 << nb_s]] + [0] * ((1 << nb_s) - len(s))))
                     for i in range(min(len(s), 1 << nb_s)):
                         if s[i][1] != 0:
-                            byte_list.append(addidx(bi_s, s[i][0]))
+                            byte_list.append(wb(s[i][0]))
                 o = b''.join(byte_list)
-                buf = buf + b'BONE' + pack("<I", len(o) + 8) + o
+                chunks.append(b'BONE' + pack("<I", len(o) + 8) + o)
 
             # materials
             if len(materials) > 0:
@@ -1110,38 +1339,36 @@ def write_m3d(context,
                         else:
                             byte_list.append(pack("<f", p[1]))
                     o = b''.join(byte_list)
-                    buf = buf + b'MTRL' + pack("<I", len(o) + 8) + o
+                    chunks.append(b'MTRL' + pack("<I", len(o) + 8) + o)
 
             # triangle mesh
-            if len(faces) > 0:
-                l = -1
+            if len(face_m) > 0:
+                # one record per triangle, a header byte and then the indices of each corner
+                cols = []
+                for i in range(3):
+                    cols.append(("v%d" % i, face_v[:, i], vi_s))
+                    if use_uvs:
+                        cols.append(("t%d" % i, face_t[:, i], ti_s))
+                    if use_normals:
+                        cols.append(("n%d" % i, face_n[:, i], vi_s))
+                cols = [c for c in cols if c[2] < 3]
+                o = np.empty(len(face_m), dtype=[("h", "<u1")] + [(k, idx_dtypes[fmt]) for k, a, fmt in cols])
+                o["h"] = (3 << 4) | use_uvs | (use_normals << 1)
+                for k, a, fmt in cols:
+                    o[k] = a & idx_masks[fmt]
+                size = o.itemsize
+                o = o.tobytes()
+                # the records are cut up where the material changes, to insert a material record
+                starts = np.flatnonzero(np.r_[face_m[0] != -1, face_m[1:] != face_m[:-1]]).tolist()
                 byte_list = []
-                for f in faces:
-                    if l != f[0]:
-                        l = f[0]
-                        byte_list.append(pack("<b", 0))
-                        byte_list.append(addidx(si_s, stridx[l]))
-                    byte_list.append(pack("<b", (len(f[1]) << 4) | use_uvs | (use_normals << 1)))
-
-                    if use_uvs and use_normals:
-                        for i, v in enumerate(f[1]):
-                            byte_list.append(addidx(vi_s, v))
-                            byte_list.append(addidx(ti_s, f[2][i]))
-                            byte_list.append(addidx(vi_s, f[3][i]))
-                    elif use_uvs:
-                        for i, v in enumerate(f[1]):
-                            byte_list.append(addidx(vi_s, v))
-                            byte_list.append(addidx(ti_s, f[2][i]))
-                    elif use_normals:
-                        for i, v in enumerate(f[1]):
-                            byte_list.append(addidx(vi_s, v))
-                            byte_list.append(addidx(vi_s, f[3][i]))
-                    else:
-                        for v in f[1]:
-                            byte_list.append(addidx(vi_s, v))
+                i = 0
+                for j in starts:
+                    byte_list.extend([o[i * size:j * size], pack("<b", 0), addidx(si_s, stridx[int(face_m[j])])])
+                    i = j
+                byte_list.append(o[i * size:])
 
                 o = b''.join(byte_list)
-                buf = buf + b'MESH' + pack("<I", len(o) + 8) + o
+                chunks.append(b'MESH' + pack("<I", len(o) + 8) + o)
 
             # labels (usused for now)
             if len(labels) > 0:
@@ -1149,45 +1376,64 @@ def write_m3d(context,
                 o = b''
                 for f in labels:
                     o = o + b''
-                buf = buf + b'LBLS' + pack("<I", len(o) + 8) + o
+                chunks.append(b'LBLS' + pack("<I", len(o) + 8) + o)
 
             # actions (animations)
             if len(actions) > 0:
+                wf = idxwriter(fc_s)
+                # one record per changed bone (bone index, pos and ori vertex indices)
+                cols = [(k, i, fmt) for i, (k, fmt) in enumerate((("b", bi_s), ("p", vi_s), ("o", vi_s))) if fmt < 3]
+                fields = [(k, idx_dtypes[fmt]) for k, i, fmt in cols]
                 for a in actions:
                     if len(a[2]) < 1:
                         continue
+                    # convert the records of all frames at once, then cut that up per frame
+                    t = np.concatenate([f[1] for f in a[2]])
+                    o = np.empty(len(t), dtype=fields)
+                    for k, i, fmt in cols:
+                        o[k] = t[:, i] & idx_masks[fmt]
+                    size = o.itemsize
+                    o = o.tobytes()
                     byte_list = [addidx(si_s, stridx[a[0]]), pack("<H", len(a[2])), pack("<I", a[1])]
+                    i = 0
                     for f in a[2]:
-                        byte_list.extend([pack("<I", f[0]), addidx(fc_s, len(f[1]))])
-                        for t in f[1]:
-                            byte_list.extend([addidx(bi_s, t[0]), addidx(vi_s, t[1]), addidx(vi_s, t[2])])
+                        byte_list.extend([pack("<I", f[0]), wf(len(f[1])), o[i:i + len(f[1]) * size]])
+                        i += len(f[1]) * size
                     o = b''.join(byte_list)
-                    buf = buf + b'ACTN' + pack("<I", len(o) + 8) + o
+                    chunks.append(b'ACTN' + pack("<I", len(o) + 8) + o)
 
             # inlined assets
             if len(inlined) > 0:
-                byte_list = [buf]
                 for i in inlined:
                     o = addidx(si_s, stridx[i[0]]) + i[1]
-                    byte_list.append(b'ASET' + pack("<I", len(o) + 8) + o)
-                buf = b''.join(byte_list)
+                    chunks.append(b'ASET' + pack("<I", len(o) + 8) + o)
 
             # extra chunks
             if len(extras) > 0:
-                byte_list = [buf]
                 for e in extras:
-                    byte_list.append(e[0][0:4] + pack("<I", len(e[1]) + 8) + e[1])
-                buf = b''.join(byte_list)
+                    chunks.append(e[0][0:4] + pack("<I", len(e[1]) + 8) + e[1])
 
             # End chunk
-            buf = buf + b'OMD3'
-            if use_strmcompress:
-                buf = zlib.compress(buf, 9)
+            chunks.append(b'OMD3')
 
-            # add file header and write out file
+            # add file header and write out file. The chunks are never joined,
+            # and the deflated stream is written out as it's produced instead
+            # of being held in memory, so the file size in the header is only
+            # patched in at the end
             with open(filepath, 'wb') as f:
-                s = len(buf) + 8
-                f.write(b'3DMO' + pack("<L", s) + buf)
+                f.write(b'3DMO' + pack("<L", 0))
+                if use_strmcompress:
+                    co = zlib.compressobj(use_complevel)
+                    for buf in chunks:
+                        view = memoryview(buf)
+                        for o in range(0, len(view), 1 << 20):
+                            f.write(co.compress(view[o:o + (1 << 20)]))
+                    f.write(co.flush())
+                else:
+                    f.writelines(chunks)
+                s = f.tell()
+                f.seek(4)
+                f.write(pack("<L", s))
 
         bpy.context.window_manager.progress_end()
 
@@ -1332,6 +1578,12 @@ class ExportM3D(bpy.types.Operator, ExportHelper):
         description="Use timeline markers for animations instead of actions",
         default=False,
     )
+    use_keyframes: BoolProperty(
+        name="Keyframes Only",
+        description="Only sample frames with keyframes on them, much faster for sparse actions, but the player "
+                    "interpolates in-between frames linearly. Rigs with drivers or constraints use every frame",
+        default=False,
+    )
     use_fps: IntProperty(
         name="FPS",
         description="Specify frame per second. Blender only nows about frames",
@@ -1374,6 +1626,12 @@ class ExportM3D(bpy.types.Operator, ExportHelper):
         description="Use lossless deflate on binary data. Unless you're writing your own M3D parser, keep it checked",
         default=True,
     )
+    use_complevel: IntProperty(
+        name="Compression Level",
+        description="Deflate level of the stream compression, 9 is slow and only saves a few percent over the default",
+        min=1, max=9,
+        default=6,
+    )
     use_ascii: BoolProperty(
         name="Use ASCII variant",
         description="Use plain text variant of Model 3D for output",